@@ -1,21 +1,24 @@
-import re
 import json
+import asyncio
+import hashlib
 import os
 import smtplib
 import ssl
+import threading
+import time
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta, timezone
+from operator import attrgetter
 from typing import List, Dict, Any
 
 import arxiv
 
 try:
-    from openai import OpenAI
+    import orjson
 
-    OPENAI_AVAILABLE = True
+    ORJSON_AVAILABLE = True
 except ImportError:
-    OPENAI_AVAILABLE = False
+    ORJSON_AVAILABLE = False
 
 CATEGORIES = {
     "AI": ["cs.AI", "cs.LG", "cs.CV", "cs.CL", "cs.NE"],
@@ -23,71 +26,191 @@ CATEGORIES = {
 }
 
 DOWNLOADED_PAPERS_FILE = "downloaded_papers.json"
+SUMMARY_CACHE_FILE = "summary_cache.json"
+
+SUMMARY_MODEL = "qwen-max"
+SUMMARY_PROMPT_VERSION = 2
+SUMMARY_SYSTEM_PROMPT = (
+    "用3-4句中文概括以下论文摘要（200字以内）：研究问题、主要方法、核心贡献、关键结果。"
+    "不引入原文未有的信息，避免翻译腔，无需背景介绍。"
+)
+SUMMARY_MAX_TOKENS = 220
+SUMMARY_CONCURRENCY = 4
+SUMMARY_CACHE_MAX_ENTRIES = 500
+
+AUTHOR_NAME = attrgetter("name")
+
+SSL_CONTEXT = ssl.create_default_context()
+
+ARXIV_DELAY_SECONDS = 3
+ARXIV_NUM_RETRIES = 5
+ARXIV_LOCK = threading.Lock()
+ARXIV_LAST_REQUEST = 0.0
 
 AI_CLIENT = None
-if OPENAI_AVAILABLE:
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if api_key:
-        AI_CLIENT = OpenAI(
+SUMMARY_CACHE: Dict[str, str] = {}
+
+
+def get_ai_client():
+    global AI_CLIENT
+    if AI_CLIENT is None:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            return None
+        try:
+            from openai import AsyncOpenAI
+        except ImportError:
+            return None
+        AI_CLIENT = AsyncOpenAI(
             api_key=api_key,
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
         )
+    return AI_CLIENT
+
+
+def read_json(path: str, default: Any) -> Any:
+    if not os.path.exists(path):
+        return default
+    try:
+        if ORJSON_AVAILABLE:
+            with open(path, "rb") as f:
+                return orjson.loads(f.read())
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    tmp_file = f"{path}.tmp"
+    if ORJSON_AVAILABLE:
+        with open(tmp_file, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_file, path)
 
 
 def load_downloaded_papers() -> Dict[str, int]:
-    if os.path.exists(DOWNLOADED_PAPERS_FILE):
-        try:
-            with open(DOWNLOADED_PAPERS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
+    downloaded: Dict[str, int] = {}
+    for key, version in read_json(DOWNLOADED_PAPERS_FILE, {}).items():
+        arxiv_id = get_arxiv_id(key)
+        downloaded[arxiv_id] = max(version, downloaded.get(arxiv_id, 0))
+    return downloaded
 
 
 def save_downloaded_papers(downloaded: Dict[str, int]) -> None:
-    with open(DOWNLOADED_PAPERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(downloaded, f, ensure_ascii=False, indent=2)
+    write_json_atomic(DOWNLOADED_PAPERS_FILE, downloaded)
+
+
+def summary_cache_version() -> str:
+    return f"{SUMMARY_MODEL}|{SUMMARY_PROMPT_VERSION}"
+
+
+def load_summary_cache() -> Dict[str, str]:
+    saved = read_json(SUMMARY_CACHE_FILE, {})
+    if not isinstance(saved, dict) or saved.get("version") != summary_cache_version():
+        return {}
+    return saved.get("entries", {})
+
+
+def save_summary_cache(cache: Dict[str, str]) -> None:
+    entries = list(cache.items())[-SUMMARY_CACHE_MAX_ENTRIES:]
+    write_json_atomic(
+        SUMMARY_CACHE_FILE,
+        {"version": summary_cache_version(), "entries": dict(entries)},
+    )
+
+
+def summary_cache_key(text: str) -> str:
+    raw = f"{SUMMARY_MODEL}|{SUMMARY_PROMPT_VERSION}|{text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
 def is_new_version(
-    pdf_url: str, current_version: int, downloaded: Dict[str, int]
+    arxiv_id: str, current_version: int, downloaded: Dict[str, int]
 ) -> bool:
-    if pdf_url not in downloaded:
+    if arxiv_id not in downloaded:
         return True
-    return current_version > downloaded[pdf_url]
+    return current_version > downloaded[arxiv_id]
+
+
+def get_arxiv_id(pdf_url: str | None) -> str:
+    if not pdf_url:
+        return ""
+    tail = pdf_url.removesuffix(".pdf").split("/pdf/", 1)[-1]
+    head, sep, version = tail.rpartition("v")
+    if sep and version.isdigit():
+        return head
+    return tail
 
 
 def get_version_from_pdf_url(pdf_url: str | None) -> int:
     if not pdf_url:
         return 1
-    match = re.search(r"v(\d+)", pdf_url)
-    if match:
-        return int(match.group(1))
-    return 1
+    try:
+        return int(pdf_url.removesuffix(".pdf").rsplit("v", 1)[-1])
+    except ValueError:
+        return 1
 
 
-def ai_summarize_zh(text: str) -> str:
-    if not AI_CLIENT or not text:
+async def ai_summarize_zh(text: str) -> str:
+    if not text:
+        return ""
+    text = text[:4000]
+    key = summary_cache_key(text)
+    if key in SUMMARY_CACHE:
+        return SUMMARY_CACHE[key]
+    client = get_ai_client()
+    if not client:
         return ""
     try:
-        response = AI_CLIENT.chat.completions.create(
-            model="qwen-max",
+        response = await client.chat.completions.create(
+            model=SUMMARY_MODEL,
             messages=[
-                {
-                    "role": "system",
-                    "content": "用3-4句简洁的中文概括以下学术论文摘要（200字以内），抓住：1）研究问题和目标；2）主要方法或技术；3）核心贡献或创新点；4）关键结果。直接明了;5) 避免翻译腔，且不要引入原文未出现的信息，无需背景介绍。",
-                },
-                {"role": "user", "content": text[:4000]},
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": text},
             ],
-            max_tokens=300,
+            max_tokens=SUMMARY_MAX_TOKENS,
             temperature=0.3,
         )
         content = response.choices[0].message.content
-        return content.strip() if content else ""
+        summary = content.strip() if content else ""
+        if summary:
+            SUMMARY_CACHE[key] = summary
+        return summary
     except Exception:
         return ""
 
 
+async def summarize_papers(papers: List[Dict[str, Any]]) -> None:
+    semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+    async def summarize(text: str) -> str:
+        async with semaphore:
+            return await ai_summarize_zh(text)
+
+    summaries = await asyncio.gather(*[summarize(p["summary"]) for p in papers])
+    for paper, summary in zip(papers, summaries):
+        paper["summary_zh"] = summary
+
+
+def as_utc(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def wait_for_arxiv_slot() -> None:
+    global ARXIV_LAST_REQUEST
+    with ARXIV_LOCK:
+        wait = ARXIV_LAST_REQUEST + ARXIV_DELAY_SECONDS - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        ARXIV_LAST_REQUEST = time.monotonic()
+
+
 def search_papers(category: str, max_results: int = 50) -> List[arxiv.Result]:
     category_codes = CATEGORIES[category]
     queries = [f"cat:{cat}" for cat in category_codes]
@@ -99,20 +222,31 @@ def search_papers(category: str, max_results: int = 50) -> List[arxiv.Result]:
         sort_by=arxiv.SortCriterion.LastUpdatedDate,
     )
 
-    client = arxiv.Client()
-    results = list(client.results(search))
-    return results
+    client = arxiv.Client(
+        page_size=max_results, delay_seconds=ARXIV_DELAY_SECONDS, num_retries=0
+    )
+    for _ in range(ARXIV_NUM_RETRIES):
+        wait_for_arxiv_slot()
+        try:
+            return list(client.results(search))
+        except Exception:
+            continue
+    wait_for_arxiv_slot()
+    return list(client.results(search))
 
 
-def get_paper_info(paper: arxiv.Result) -> Dict[str, Any]:
+def get_paper_info(paper: arxiv.Result, arxiv_id: str, version: int) -> Dict[str, Any]:
+    authors = paper.authors
     return {
         "title": paper.title,
-        "authors": [author.name for author in paper.authors],
+        "authors": list(map(AUTHOR_NAME, authors[:5])),
+        "author_count": len(authors),
         "summary": paper.summary,
         "published": paper.published,
         "updated": paper.updated,
-        "version": get_version_from_pdf_url(paper.pdf_url),
+        "version": version,
         "pdf_url": paper.pdf_url,
+        "arxiv_id": arxiv_id,
         "doi": paper.doi,
         "primary_category": paper.primary_category,
         "comment": paper.comment,
@@ -120,100 +254,97 @@ def get_paper_info(paper: arxiv.Result) -> Dict[str, Any]:
     }
 
 
-def filter_recent_by_published(
-    papers: List[arxiv.Result], days: int = 180
-) -> List[arxiv.Result]:
-    date_limit = datetime.now(timezone.utc) - timedelta(days=days)
-    recent_papers = []
+def partition_recent(
+    papers: List[arxiv.Result], date_limit: datetime, min_version: int = 2
+) -> tuple[List[tuple[arxiv.Result, int]], List[tuple[arxiv.Result, int]]]:
+    recent_published = []
+    recent_updated = []
     for paper in papers:
-        if paper.published.replace(tzinfo=timezone.utc) >= date_limit:
-            recent_papers.append(paper)
-    return recent_papers
+        version = get_version_from_pdf_url(paper.pdf_url)
+        if as_utc(paper.published) >= date_limit:
+            recent_published.append((paper, version))
+        if as_utc(paper.updated) >= date_limit and version >= min_version:
+            recent_updated.append((paper, version))
+    return recent_published, recent_updated
+
+
+def collect_candidates(
+    papers: List[tuple[arxiv.Result, int]],
+    candidates: List[Dict[str, Any]],
+    seen_ids: set[str],
+    downloaded: Dict[str, int],
+) -> None:
+    for paper, version in papers:
+        arxiv_id = get_arxiv_id(paper.pdf_url)
+        if arxiv_id in seen_ids:
+            continue
+        seen_ids.add(arxiv_id)
+        if not is_new_version(arxiv_id, version, downloaded):
+            continue
+        candidates.append(get_paper_info(paper, arxiv_id, version))
 
 
-def filter_recent_by_updated(
-    papers: List[arxiv.Result], days: int = 180, min_version: int = 2
-) -> List[arxiv.Result]:
-    date_limit = datetime.now(timezone.utc) - timedelta(days=days)
-    recent_papers = []
+def add_display_fields(papers: List[Dict[str, Any]]) -> None:
     for paper in papers:
-        updated_date = paper.updated.replace(tzinfo=timezone.utc)
-        version = get_version_from_pdf_url(paper.pdf_url)
-        if updated_date >= date_limit and version >= min_version:
-            recent_papers.append(paper)
-    return recent_papers
+        summary = paper["summary"]
+        paper["summary_len"] = len(summary)
+        paper["summary_preview"] = summary[:1000]
+        paper["published_str"] = paper["published"].strftime("%Y-%m-%d")
+        paper["updated_str"] = paper["updated"].strftime("%Y-%m-%d")
+
+
+def render_paper(
+    paper: Dict[str, Any], kind: str, count: int, show_updated: bool
+) -> str:
+    author_count = paper["author_count"]
+    summary_len = paper["summary_len"]
+    summary_zh = paper.get("summary_zh", "")
+    return (
+        f"\n【{kind}】论文 #{count}\n"
+        + f"标题: {paper['title']}\n"
+        + f"作者: {', '.join(paper['authors'])}\n"
+        + (f"      ... 等 {author_count} 位作者\n" if author_count > 5 else "")
+        + f"发布时间: {paper['published_str']}\n"
+        + (f"更新日期: {paper['updated_str']}\n" if show_updated else "")
+        + f"版本: v{paper['version']}\n"
+        + f"分类: {paper['primary_category']}\n"
+        + (f"DOI: {paper['doi']}\n" if paper.get("doi") else "")
+        + (f"注释: {paper['comment']}\n" if paper.get("comment") else "")
+        + (f"期刊引用: {paper['journal_ref']}\n" if paper.get("journal_ref") else "")
+        + (f"\n要点: {summary_zh}\n" if summary_zh else "")
+        + f"\n完整摘要 [{summary_len} 字符]:\n"
+        + f"{paper['summary_preview']}\n"
+        + (f"... (共 {summary_len} 字符)\n" if summary_len > 1000 else "")
+        + f"\n链接: {paper['pdf_url']}\n"
+        + "=" * 34
+    )
 
 
 def format_papers_for_email(
     updated_papers: List[Dict[str, Any]],
     published_papers: List[Dict[str, Any]],
+    now_str: str,
 ) -> str:
-    lines = []
-    lines.append(f"日期: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-    lines.append(f"新论文: {len(updated_papers) + len(published_papers)} 篇\n")
-    lines.append("=" * 34)
-
-    count = 1
-    for paper in updated_papers:
-        lines.append(f"\n【更新】论文 #{count}")
-        lines.append(f"标题: {paper['title']}")
-        lines.append(f"作者: {', '.join(paper['authors'][:5])}")
-        if len(paper["authors"]) > 5:
-            lines.append(f"      ... 等 {len(paper['authors'])} 位作者")
-        lines.append(f"发布时间: {paper['published'].strftime('%Y-%m-%d')}")
-        lines.append(f"更新日期: {paper['updated'].strftime('%Y-%m-%d')}")
-        lines.append(f"版本: v{paper['version']}")
-        lines.append(f"分类: {paper['primary_category']}")
-        if paper.get("doi"):
-            lines.append(f"DOI: {paper['doi']}")
-        if paper.get("comment"):
-            lines.append(f"注释: {paper['comment']}")
-        if paper.get("journal_ref"):
-            lines.append(f"期刊引用: {paper['journal_ref']}")
-        summary = ai_summarize_zh(paper["summary"])
-        if summary:
-            lines.append(f"\n要点: {summary}")
-        lines.append(f"\n完整摘要 [{len(paper['summary'])} 字符]:")
-        lines.append(paper["summary"][:1000])
-        if len(paper["summary"]) > 1000:
-            lines.append(f"... (共 {len(paper['summary'])} 字符)")
-        lines.append(f"\n链接: {paper['pdf_url']}")
-        lines.append("=" * 34)
-        count += 1
-
-    for paper in published_papers:
-        lines.append(f"\n【发布】论文 #{count}")
-        lines.append(f"标题: {paper['title']}")
-        lines.append(f"作者: {', '.join(paper['authors'][:5])}")
-        if len(paper["authors"]) > 5:
-            lines.append(f"      ... 等 {len(paper['authors'])} 位作者")
-        lines.append(f"发布时间: {paper['published'].strftime('%Y-%m-%d')}")
-        lines.append(f"版本: v{paper['version']}")
-        lines.append(f"分类: {paper['primary_category']}")
-        if paper.get("doi"):
-            lines.append(f"DOI: {paper['doi']}")
-        if paper.get("comment"):
-            lines.append(f"注释: {paper['comment']}")
-        if paper.get("journal_ref"):
-            lines.append(f"期刊引用: {paper['journal_ref']}")
-        summary = ai_summarize_zh(paper["summary"])
-        if summary:
-            lines.append(f"\n要点: {summary}")
-        lines.append(f"\n完整摘要 [{len(paper['summary'])} 字符]:")
-        lines.append(paper["summary"][:1000])
-        if len(paper["summary"]) > 1000:
-            lines.append(f"... (共 {len(paper['summary'])} 字符)")
-        lines.append(f"\n链接: {paper['pdf_url']}")
-        lines.append("=" * 34)
-        count += 1
-
-    return "\n".join(lines)
+    header = (
+        f"日期: {now_str}\n"
+        + f"新论文: {len(updated_papers) + len(published_papers)} 篇\n\n"
+        + "=" * 34
+    )
+    entries = [
+        render_paper(paper, "更新", count, show_updated=True)
+        for count, paper in enumerate(updated_papers, start=1)
+    ]
+    entries += [
+        render_paper(paper, "发布", count, show_updated=False)
+        for count, paper in enumerate(published_papers, start=len(entries) + 1)
+    ]
+    return "\n".join([header] + entries)
 
 
 def send_email_via_qq(
     subject: str,
     body: str,
-    recipient: str,
+    recipients: List[str],
 ) -> bool:
     sender = os.environ.get("QQ_EMAIL")
     auth_code = os.environ.get("QQ_EMAIL_AUTH_CODE")
@@ -226,52 +357,59 @@ def send_email_via_qq(
     smtp_port = 587
 
     try:
-        msg = MIMEMultipart()
-        msg["From"] = sender
-        msg["To"] = recipient
-        msg["Subject"] = subject
-        msg.attach(MIMEText(body, "plain", "utf-8"))
-
-        context = ssl.create_default_context()
+        all_sent = True
         with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls(context=context)
+            server.starttls(context=SSL_CONTEXT)
             server.login(sender, auth_code)
-            server.sendmail(sender, recipient, msg.as_string())
-
-        print(f"邮件已发送到 {recipient}")
-        return True
+            msg = MIMEText(body, "plain", "utf-8")
+            msg["From"] = sender
+            msg["Subject"] = subject
+            for recipient in recipients:
+                del msg["To"]
+                msg["To"] = recipient
+                try:
+                    server.sendmail(sender, recipient, msg.as_string())
+                    print(f"邮件已发送到 {recipient}")
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as e:
+                    print(f"邮件发送到 {recipient} 失败: {e}")
+                    all_sent = False
+
+        return all_sent
     except Exception as e:
         print(f"邮件发送失败: {e}")
         return False
 
 
-def main():
+async def main():
+    date_limit = datetime.now(timezone.utc) - timedelta(days=180)
     downloaded = load_downloaded_papers()
+    SUMMARY_CACHE.update(load_summary_cache())
 
     candidate_updated: List[Dict[str, Any]] = []
     candidate_published: List[Dict[str, Any]] = []
 
-    for category in ["AI", "Security"]:
+    def search_category(category: str) -> List[arxiv.Result]:
+        try:
+            return search_papers(category, max_results=50)
+        except Exception:
+            return []
+
+    categories = ["AI", "Security"]
+    results = await asyncio.gather(
+        *[asyncio.to_thread(search_category, category) for category in categories]
+    )
+
+    seen_ids: set[str] = set()
+    for papers in results:
         try:
-            papers = search_papers(category, max_results=50)
-
-            recent_published = filter_recent_by_published(papers, days=180)
-            recent_updated = filter_recent_by_updated(papers, days=180, min_version=2)
-
-            updated_titles = set()
-            for paper in recent_updated:
-                info = get_paper_info(paper)
-                if not is_new_version(info["pdf_url"], info["version"], downloaded):
-                    continue
-                candidate_updated.append(info)
-                updated_titles.add(info["title"])
-
-            for paper in recent_published:
-                info = get_paper_info(paper)
-                if info["title"] not in updated_titles:
-                    if not is_new_version(info["pdf_url"], info["version"], downloaded):
-                        continue
-                    candidate_published.append(info)
+            recent_published, recent_updated = partition_recent(
+                papers, date_limit, min_version=2
+            )
+
+            collect_candidates(recent_updated, candidate_updated, seen_ids, downloaded)
+            collect_candidates(
+                recent_published, candidate_published, seen_ids, downloaded
+            )
         except Exception:
             continue
 
@@ -282,21 +420,31 @@ def main():
     all_papers_by_published = candidate_published[:2]
 
     for info in all_papers_by_updated + all_papers_by_published:
-        downloaded[info["pdf_url"]] = info["version"]
+        downloaded[info["arxiv_id"]] = info["version"]
 
     save_downloaded_papers(downloaded)
 
-    recipient = os.environ.get("RECIPIENT_EMAIL")
-    if recipient:
+    recipient_env = os.environ.get("RECIPIENT_EMAIL", "")
+    recipients = [r.strip() for r in recipient_env.split(",") if r.strip()]
+    if recipients:
+        selected = all_papers_by_updated + all_papers_by_published
+        await summarize_papers(selected)
+        add_display_fields(selected)
+
+        now = datetime.now()
         email_body = format_papers_for_email(
-            all_papers_by_updated, all_papers_by_published
+            all_papers_by_updated,
+            all_papers_by_published,
+            now.strftime("%Y-%m-%d %H:%M"),
         )
         send_email_via_qq(
-            f"学术论文速递 - {datetime.now().strftime('%Y-%m-%d')}",
+            f"学术论文速递 - {now.strftime('%Y-%m-%d')}",
             email_body,
-            recipient,
+            recipients,
         )
 
+    save_summary_cache(SUMMARY_CACHE)
+
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())